@@ -0,0 +1,398 @@
+import json
+import math
+import numbers
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+from geopy.distance import geodesic
+
+import ttn
+
+load_dotenv()
+
+TTN_KEY = os.getenv("TTN_KEY")
+ALERT_FILE = os.getenv("ALERT_FILE")
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+
+# Mooring position (defaults to Romanshorn, same place as the weather data)
+MOORING_LAT = float(os.getenv("MOORING_LAT", "47.5659"))
+MOORING_LON = float(os.getenv("MOORING_LON", "9.3787"))
+
+
+def parse_received_at(value):
+    # TTN timestamps are RFC3339 with nanoseconds, pandas parses them as UTC
+    return pd.to_datetime(value, utc=True).to_pydatetime()
+
+
+def is_valid_number(value):
+    # pandas turns missing values into NaN when converting rows to dicts
+    return isinstance(value, numbers.Real) and math.isfinite(value)
+
+
+def make_alert(rule, uplink, message):
+    return {
+        "rule": rule,
+        "received_at": str(uplink["received_at"]) if uplink is not None else None,
+        "message": message,
+    }
+
+
+class Rule:
+    # Every rule keeps only a constant amount of state, so evaluating one uplink is O(1)
+    name = "rule"
+
+    def evaluate(self, uplink):
+        return None
+
+    def tick(self, now):
+        # Called on every poll, also when no new uplink arrived
+        return None
+
+
+class GeofenceRule(Rule):
+    name = "geofence"
+
+    def __init__(self, latitude, longitude, radius_m=100):
+        self.center = (latitude, longitude)
+        self.radius_m = radius_m
+        self.outside = False
+
+    def evaluate(self, uplink):
+        # Missing coordinates or 0 mean the device had no GPS fix
+        latitude, longitude = uplink["latitude"], uplink["longitude"]
+        if not is_valid_number(latitude) or not is_valid_number(longitude):
+            return None
+        if latitude == 0 or longitude == 0:
+            return None
+
+        distance = geodesic(self.center, (latitude, longitude)).meters
+        outside = distance > self.radius_m
+
+        # Only alert when the boat leaves or comes back, not on every uplink outside
+        if outside == self.outside:
+            return None
+        self.outside = outside
+
+        if outside:
+            return make_alert(self.name, uplink, f"Boot hat den Liegeplatz verlassen ({int(distance)}m entfernt)")
+        return make_alert(self.name, uplink, f"Boot ist zurück am Liegeplatz ({int(distance)}m entfernt)")
+
+
+class BatteryRule(Rule):
+    name = "battery"
+
+    def __init__(self, threshold=3.5, window=6):
+        self.threshold = threshold
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.low = False
+
+    def evaluate(self, uplink):
+        voltage = uplink["batteryVoltage"]
+        if not is_valid_number(voltage):
+            return None
+
+        # Keep a running sum so the rolling mean does not have to be recomputed
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(voltage)
+        self.total += voltage
+
+        # Wait for a full window so a single bad reading does not trigger an alert
+        if len(self.values) < self.values.maxlen:
+            return None
+
+        mean = self.total / len(self.values)
+        low = mean < self.threshold
+        if low == self.low:
+            return None
+        self.low = low
+
+        if low:
+            return make_alert(self.name, uplink, f"Batteriespannung tief: {mean:.2f} V im Durchschnitt")
+        return make_alert(self.name, uplink, f"Batteriespannung wieder normal: {mean:.2f} V im Durchschnitt")
+
+
+class BatteryTrendRule(Rule):
+    name = "battery_trend"
+
+    def __init__(self, max_drop=0.2, window=12):
+        self.max_drop = max_drop
+        # The window is split into an older and a newer half, each with a running sum
+        self.older = deque()
+        self.newer = deque()
+        self.older_size = window // 2
+        self.newer_size = window - self.older_size
+        self.older_total = 0.0
+        self.newer_total = 0.0
+        self.falling = False
+
+    def evaluate(self, uplink):
+        voltage = uplink["batteryVoltage"]
+        if not is_valid_number(voltage):
+            return None
+
+        self.newer.append(voltage)
+        self.newer_total += voltage
+
+        # Move the oldest value of the newer half over to the older half
+        if len(self.newer) > self.newer_size:
+            moved = self.newer.popleft()
+            self.newer_total -= moved
+            if len(self.older) == self.older_size:
+                self.older_total -= self.older.popleft()
+            self.older.append(moved)
+            self.older_total += moved
+
+        if len(self.older) < self.older_size:
+            return None
+
+        drop = self.older_total / self.older_size - self.newer_total / self.newer_size
+
+        falling = drop > self.max_drop
+        if falling == self.falling:
+            return None
+        self.falling = falling
+
+        if falling:
+            return make_alert(self.name, uplink, f"Batteriespannung sinkt: {drop:.2f} V weniger als zuvor")
+        return make_alert(self.name, uplink, "Batteriespannung sinkt nicht mehr")
+
+
+class ReedSwitchRule(Rule):
+    name = "reed_switch"
+
+    def __init__(self):
+        self.last_status = None
+
+    def evaluate(self, uplink):
+        status = uplink["reedSwitchStatus"]
+        # A missing status turns into NaN in the DataFrame, which never equals itself
+        if pd.isna(status):
+            return None
+
+        previous = self.last_status
+        self.last_status = status
+
+        # The first uplink only sets the baseline
+        if previous is None or status == previous:
+            return None
+        return make_alert(self.name, uplink, f"Reed-Schalter geändert: {previous} -> {status}")
+
+
+class HumiditySpikeRule(Rule):
+    name = "humidity"
+
+    def __init__(self, max_jump=15, smoothing=0.2):
+        self.max_jump = max_jump
+        self.smoothing = smoothing
+        self.average = None
+        self.alerting = False
+
+    def evaluate(self, uplink):
+        humidity = uplink["humidity"]
+        if not is_valid_number(humidity):
+            return None
+
+        if self.average is None:
+            self.average = humidity
+            return None
+
+        # Compare against the moving average before the new value is added
+        jump = humidity - self.average
+        self.average += self.smoothing * (humidity - self.average)
+
+        # Alert once per spike, not on every uplink until the average catches up
+        alerting = jump > self.max_jump
+        if alerting == self.alerting:
+            return None
+        self.alerting = alerting
+
+        if alerting:
+            return make_alert(self.name, uplink, f"Feuchtigkeit gestiegen: {humidity} % ({jump:.1f} % über dem Durchschnitt)")
+        return None
+
+
+class MissedUplinkRule(Rule):
+    name = "missed_uplink"
+
+    def __init__(self, max_gap=timedelta(minutes=30)):
+        self.max_gap = max_gap
+        self.last_received_at = None
+        self.started_at = None
+        self.silent = False
+
+    def evaluate(self, uplink):
+        received_at = parse_received_at(uplink["received_at"])
+        previous = self.last_received_at
+        self.last_received_at = received_at
+
+        # tick() already reported this outage, only report that the device is back
+        if self.silent:
+            self.silent = False
+            return make_alert(self.name, uplink, "Uplinks werden wieder empfangen")
+
+        if previous is None:
+            return None
+
+        gap = received_at - previous
+        if gap > self.max_gap:
+            return make_alert(self.name, uplink, f"Uplinks ausgefallen: {int(gap.total_seconds() // 60)} Minuten ohne Daten")
+        return None
+
+    def tick(self, now):
+        # Without any uplink yet, count from the first poll so a silent device is still noticed
+        if self.started_at is None:
+            self.started_at = now
+
+        # Alert once while the device is silent, evaluate() resets it with the next uplink
+        if self.silent:
+            return None
+
+        last = self.last_received_at or self.started_at
+        gap = now - last
+        if gap > self.max_gap:
+            self.silent = True
+            return make_alert(self.name, None, f"Keine Uplinks seit {int(gap.total_seconds() // 60)} Minuten")
+        return None
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alert):
+        # One JSON object per line
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+class WebhookSink:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        response = requests.post(self.url, json=alert, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class PrintSink:
+    def send(self, alert):
+        print(f"[{alert['rule']}] {alert['message']}")
+
+
+class AlertEngine:
+    def __init__(self, rules, sinks):
+        self.rules = rules
+        self.sinks = sinks
+        self.last_received_at = None
+
+    def dispatch(self, alert):
+        for sink in self.sinks:
+            # A broken sink should not stop the others from being notified
+            try:
+                sink.send(alert)
+            except Exception as e:
+                print(f"Error sending alert: {e}")
+
+    def process(self, uplink):
+        alerts = []
+        for rule in self.rules:
+            # A rule failing on one bad uplink should not stop the other rules
+            try:
+                alert = rule.evaluate(uplink)
+            except Exception as e:
+                print(f"Error evaluating rule {rule.name}: {e}")
+                continue
+            if alert is not None:
+                alerts.append(alert)
+                self.dispatch(alert)
+        return alerts
+
+    def process_new(self, df):
+        # Evaluate every uplink exactly once, oldest first
+        alerts = []
+        if df.empty:
+            return alerts
+
+        df = df.assign(_received_at=pd.to_datetime(df["received_at"], utc=True))
+        df = df.sort_values(by="_received_at")
+        if self.last_received_at is not None:
+            df = df[df["_received_at"] > self.last_received_at]
+
+        received_at = df["_received_at"].tolist()
+        for index, uplink in enumerate(df.drop(columns="_received_at").to_dict("records")):
+            alerts.extend(self.process(uplink))
+            # Move forward after every uplink so nothing is evaluated twice
+            self.last_received_at = received_at[index]
+        return alerts
+
+    def tick(self, now=None):
+        if now is None:
+            now = datetime.now(timezone.utc)
+
+        alerts = []
+        for rule in self.rules:
+            alert = rule.tick(now)
+            if alert is not None:
+                alerts.append(alert)
+                self.dispatch(alert)
+        return alerts
+
+
+def default_rules():
+    return [
+        GeofenceRule(MOORING_LAT, MOORING_LON),
+        BatteryRule(),
+        BatteryTrendRule(),
+        ReedSwitchRule(),
+        HumiditySpikeRule(),
+        MissedUplinkRule(),
+    ]
+
+
+def default_sinks():
+    sinks = [PrintSink()]
+    if ALERT_FILE:
+        sinks.append(FileSink(ALERT_FILE))
+    if ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink(ALERT_WEBHOOK_URL))
+    return sinks
+
+
+def watch(engine, interval=30, timeout=20, max_failures=3):
+    # Start one hour back like the dashboard does, afterwards only ask TTN for newer uplinks
+    timestamp = ttn.get_current_timestamp_minus_one_hour()
+    failures = 0
+
+    while True:
+        # A failed poll must not stop the watcher, it just tries again on the next interval
+        try:
+            df = ttn.get_ttn_data(TTN_KEY, timestamp, timeout=timeout)
+            engine.process_new(df)
+            failures = 0
+        except Exception as e:
+            failures += 1
+            print(f"Error fetching uplinks: {e}")
+            if failures == max_failures:
+                engine.dispatch(make_alert("fetch", None, f"Uplinks konnten {failures} Mal nicht abgerufen werden: {e}"))
+
+        try:
+            engine.tick()
+        except Exception as e:
+            print(f"Error checking rules: {e}")
+
+        if engine.last_received_at is not None:
+            timestamp = engine.last_received_at.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    watch(AlertEngine(default_rules(), default_sinks()))
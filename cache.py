@@ -0,0 +1,302 @@
+import contextlib
+import functools
+import hashlib
+import inspect
+import io
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND")
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def serialize(df):
+    # Only DataFrames are cached, they are stored as Parquet so every replica can read them
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError(f"Only DataFrames can be cached, got {type(df).__name__}")
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, engine="pyarrow")
+    return buffer.getvalue()
+
+
+def deserialize(data):
+    return pd.read_parquet(io.BytesIO(data), engine="pyarrow")
+
+
+def code_version(func):
+    # Entries written by an older version of the function are not served after a deploy
+    try:
+        code = inspect.getsource(func).encode("utf-8")
+    except (OSError, TypeError):
+        code = func.__code__.co_code
+    return hashlib.sha256(code).hexdigest()[:16]
+
+
+def make_key(func, args, kwargs, version=None):
+    # Hash the arguments so secrets (e.g. the TTN key) never end up in a file name or redis key
+    if version is None:
+        version = code_version(func)
+    raw = repr((args, sorted(kwargs.items()))).encode("utf-8")
+    return f"{func.__module__}.{func.__qualname__}:{version}:{hashlib.sha256(raw).hexdigest()}"
+
+
+class DiskCache:
+    def __init__(self, directory=CACHE_DIR, prune_interval=300):
+        self.directory = directory
+        self.prune_interval = prune_interval
+        self.last_prune = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + suffix)
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            expires_at = float(f.readline())
+            return expires_at, f.read()
+
+    def _read_expiry(self, path):
+        # Only the header line, so pruning does not load every cached frame
+        with open(path, "rb") as f:
+            return float(f.readline())
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        path = self._path(key, ".parquet")
+        try:
+            expires_at, data = self._read(path)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if expires_at < time.time():
+            self._remove(path)
+            return None
+        return data
+
+    def set(self, key, data, ttl):
+        path = self._path(key, ".parquet")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        # Write to a temporary file first so readers never see a half written entry
+        with open(tmp_path, "wb") as f:
+            f.write(f"{time.time() + ttl}\n".encode("ascii"))
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if time.time() - self.last_prune > self.prune_interval:
+            self.prune()
+
+    def prune(self):
+        # Keys that are never read again (e.g. the per minute TTN requests) would otherwise stay forever
+        self.last_prune = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".parquet"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                expires_at = self._read_expiry(path)
+            except (FileNotFoundError, ValueError):
+                continue
+            if expires_at < self.last_prune:
+                self._remove(path)
+
+    def acquire(self, key, timeout):
+        path = self._path(key, ".lock")
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, "w") as f:
+                f.write(token)
+            return token
+        except FileExistsError:
+            pass
+
+        # Take over locks left behind by a crashed process
+        try:
+            if time.time() - os.path.getmtime(path) > timeout:
+                self._remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def release(self, key, token):
+        # Only remove our own lock, it may have been taken over while we were slow
+        path = self._path(key, ".lock")
+        try:
+            with open(path, "r") as f:
+                owner = f.read()
+        except FileNotFoundError:
+            return
+        if owner == token:
+            self._remove(path)
+
+
+class RedisCache:
+    # Delete the lock only if it still holds our token
+    RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, client=None, url=REDIS_URL, prefix="boat-monitor:"):
+        if client is None:
+            # Only needed when the redis backend is actually used
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.release_script = client.register_script(self.RELEASE_SCRIPT)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, data, ttl):
+        self.client.set(self.prefix + key, data, ex=int(ttl))
+
+    def acquire(self, key, timeout):
+        # The lock expires on its own if the process holding it dies
+        token = uuid.uuid4().hex
+        if self.client.set(self.prefix + "lock:" + key, token, nx=True, ex=int(timeout)):
+            return token
+        return None
+
+    def release(self, key, token):
+        self.release_script(keys=[self.prefix + "lock:" + key], args=[token])
+
+
+def create_backend(name=CACHE_BACKEND):
+    if name == "disk":
+        return DiskCache()
+    if name == "redis":
+        return RedisCache()
+    return None
+
+
+_backend = None
+_backend_created = False
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend, _backend_created
+    with _backend_lock:
+        if not _backend_created:
+            # Without a working backend the data is simply loaded without the shared cache
+            try:
+                _backend = create_backend()
+            except Exception as e:
+                print(f"Error creating cache backend: {e}")
+                _backend = None
+            _backend_created = True
+    return _backend
+
+
+def set_backend(backend):
+    global _backend, _backend_created
+    with _backend_lock:
+        _backend = backend
+        _backend_created = True
+
+
+# One lock per key, so threads of the same replica wait for each other instead of polling
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _key_lock(key):
+    # Count the users of each lock so it can be dropped again once nobody waits for the key
+    with _key_locks_lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _key_locks[key]
+
+
+def _load(backend, key):
+    # A broken backend or a corrupt entry is treated like a miss
+    try:
+        data = backend.get(key)
+        return deserialize(data) if data is not None else None
+    except Exception as e:
+        print(f"Error reading from cache: {e}")
+        return None
+
+
+def shared_cache(ttl, lock_timeout=120, poll_interval=0.2):
+    def decorator(func):
+        version = code_version(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            if backend is None:
+                return func(*args, **kwargs)
+
+            key = make_key(func, args, kwargs, version)
+
+            # The cache is best effort, only errors raised by func itself reach the caller
+            with _key_lock(key):
+                deadline = time.time() + lock_timeout
+                while True:
+                    df = _load(backend, key)
+                    if df is not None:
+                        return df
+
+                    # Only the replica holding the lock calls upstream, the others wait for its result
+                    try:
+                        token = backend.acquire(key, lock_timeout)
+                    except Exception as e:
+                        print(f"Error locking cache entry: {e}")
+                        return func(*args, **kwargs)
+                    if token is not None:
+                        break
+                    if time.time() > deadline:
+                        # Give up waiting and load the data ourselves
+                        return func(*args, **kwargs)
+                    time.sleep(poll_interval)
+
+                try:
+                    # Another replica may have stored the result between our get and acquire
+                    df = _load(backend, key)
+                    if df is not None:
+                        return df
+
+                    df = func(*args, **kwargs)
+                    try:
+                        backend.set(key, serialize(df), ttl)
+                    except Exception as e:
+                        print(f"Error writing to cache: {e}")
+                    return df
+                finally:
+                    try:
+                        backend.release(key, token)
+                    except Exception as e:
+                        print(f"Error unlocking cache entry: {e}")
+
+        return wrapper
+
+    return decorator
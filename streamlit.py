@@ -1,5 +1,7 @@
 import streamlit as st
 import ttn
+import cache
+import requests
 import json
 import pandas as pd
 from datetime import timedelta, datetime
@@ -52,6 +54,7 @@ def create_bigquery_connection(PROJECT):
 
 
 @st.cache_data
+@cache.shared_cache(ttl=3600)
 def query_bigquery_return_df(query, PROJECT):
     query_job = create_bigquery_connection(PROJECT).query(query)
     results = query_job.result()
@@ -127,6 +130,7 @@ def get_openmeteo_client():
 
 
 @st.cache_data
+@cache.shared_cache(ttl=3600)
 def fetch_weather_data(past_days):
     # Initialize the Open-Meteo API client
     openmeteo = get_openmeteo_client()
@@ -174,6 +178,11 @@ def fetch_weather_data(past_days):
     return hourly_dataframe
 
 
+@cache.shared_cache(ttl=60)
+def fetch_ttn_data(timestamp):
+    return ttn.get_ttn_data(TTN_KEY, timestamp)
+
+
 def plot_current_location(df, show_data_transfer=False, show_last_steps=False):
     # Filter entries with valid device latitude and longitude
     valid_entries = df[(df["latitude"] != 0) & (df["longitude"] != 0)]
@@ -530,8 +539,7 @@ def plot_history_weather_hum(df):
     st.plotly_chart(fig, use_container_width=True)
 
 
-def run_app():
-    current_data = ttn.get_ttn_data(TTN_KEY)
+def show_current_data(current_data):
     current_data["received_at"] = pd.to_datetime(current_data["received_at"])
     current_data = current_data.sort_values(by="received_at", ascending=False)
 
@@ -555,6 +563,19 @@ def run_app():
     plot_current_location(current_data, show_data_transfer,show_last_steps)
     show_current_measurements(current_data)
 
+
+def run_app():
+    # Upstream errors are raised instead of cached, show them instead of the current data
+    try:
+        current_data = fetch_ttn_data(ttn.get_current_timestamp_minus_one_hour())
+    except requests.RequestException as e:
+        st.error(f"Die aktuellen Daten konnten nicht geladen werden: {e}")
+    else:
+        if current_data.empty:
+            st.warning("In der letzten Stunde wurden keine Daten vom Boot empfangen.")
+        else:
+            show_current_data(current_data)
+
     st.title("Historische Daten")
     st.info(
         "Diese Daten werden nur stündlich aktualisiert und sind daher nicht in Echtzeit."
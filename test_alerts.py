@@ -0,0 +1,265 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+import alerts
+
+MOORING = (47.5659, 9.3787)
+START = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class ListSink:
+    def __init__(self):
+        self.alerts = []
+
+    def send(self, alert):
+        self.alerts.append(alert)
+
+
+def make_uplink(minutes, **values):
+    uplink = {
+        "received_at": (START + timedelta(minutes=minutes)).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "batteryVoltage": 4.0,
+        "humidity": 50.0,
+        "latitude": MOORING[0],
+        "longitude": MOORING[1],
+        "reedSwitchStatus": 0,
+        "satellites": 7,
+        "temperature": 20.0,
+        "count_gw": 1,
+    }
+    uplink.update(values)
+    return uplink
+
+
+def make_df(*uplinks):
+    return pd.DataFrame(list(uplinks))
+
+
+def test_geofence_alerts_on_exit_and_return_only():
+    rule = alerts.GeofenceRule(*MOORING, radius_m=100)
+
+    assert rule.evaluate(make_uplink(0)) is None
+    assert "verlassen" in rule.evaluate(make_uplink(1, latitude=47.57))["message"]
+    assert rule.evaluate(make_uplink(2, latitude=47.571)) is None
+    # No GPS fix is ignored
+    assert rule.evaluate(make_uplink(3, latitude=0, longitude=0)) is None
+    assert "zurück" in rule.evaluate(make_uplink(4))["message"]
+
+
+def test_geofence_skips_missing_coordinates():
+    rule = alerts.GeofenceRule(*MOORING, radius_m=100)
+
+    assert rule.evaluate(make_uplink(0, latitude=float("nan"))) is None
+    assert rule.evaluate(make_uplink(1, latitude=None, longitude=None)) is None
+    assert rule.outside is False
+
+
+def test_battery_rule_uses_full_window_and_skips_nan():
+    rule = alerts.BatteryRule(threshold=3.5, window=3)
+
+    assert rule.evaluate(make_uplink(0, batteryVoltage=3.0)) is None
+    assert rule.evaluate(make_uplink(1, batteryVoltage=float("nan"))) is None
+    assert rule.evaluate(make_uplink(2, batteryVoltage=None)) is None
+    assert rule.evaluate(make_uplink(3, batteryVoltage=3.2)) is None
+    assert "tief" in rule.evaluate(make_uplink(4, batteryVoltage=3.1))["message"]
+    assert rule.evaluate(make_uplink(5, batteryVoltage=3.1)) is None
+    assert rule.evaluate(make_uplink(6, batteryVoltage=4.2)) is None
+    assert "normal" in rule.evaluate(make_uplink(7, batteryVoltage=4.2))["message"]
+
+
+def test_battery_trend_rule_detects_falling_voltage():
+    rule = alerts.BatteryTrendRule(max_drop=0.2, window=4)
+
+    for minutes, voltage in enumerate([4.0, 4.0, 4.0]):
+        assert rule.evaluate(make_uplink(minutes, batteryVoltage=voltage)) is None
+    assert rule.evaluate(make_uplink(3, batteryVoltage=3.9)) is None
+    assert "sinkt" in rule.evaluate(make_uplink(4, batteryVoltage=3.6))["message"]
+    assert rule.evaluate(make_uplink(5, batteryVoltage=3.5)) is None
+    # Voltage levels off again
+    for minutes in range(6, 10):
+        rule.evaluate(make_uplink(minutes, batteryVoltage=3.5))
+    assert rule.falling is False
+
+
+def test_reed_switch_rule_alerts_on_change():
+    rule = alerts.ReedSwitchRule()
+
+    assert rule.evaluate(make_uplink(0, reedSwitchStatus=0)) is None
+    assert rule.evaluate(make_uplink(1, reedSwitchStatus=0)) is None
+    assert "0 -> 1" in rule.evaluate(make_uplink(2, reedSwitchStatus=1))["message"]
+
+
+def test_reed_switch_rule_skips_missing_status():
+    rule = alerts.ReedSwitchRule()
+
+    assert rule.evaluate(make_uplink(0, reedSwitchStatus=1)) is None
+    assert rule.evaluate(make_uplink(1, reedSwitchStatus=float("nan"))) is None
+    assert rule.evaluate(make_uplink(2, reedSwitchStatus=None)) is None
+    assert rule.evaluate(make_uplink(3, reedSwitchStatus=1)) is None
+
+
+def test_humidity_rule_alerts_once_per_spike():
+    rule = alerts.HumiditySpikeRule(max_jump=15, smoothing=0.2)
+
+    assert rule.evaluate(make_uplink(0, humidity=50)) is None
+    assert rule.evaluate(make_uplink(1, humidity=80)) is not None
+    assert rule.evaluate(make_uplink(2, humidity=80)) is None
+    assert rule.evaluate(make_uplink(3, humidity=float("nan"))) is None
+
+
+def test_missed_uplink_rule_reports_gap_once():
+    rule = alerts.MissedUplinkRule(max_gap=timedelta(minutes=30))
+
+    assert rule.evaluate(make_uplink(0)) is None
+    assert rule.tick(START + timedelta(minutes=10)) is None
+    assert "Keine Uplinks" in rule.tick(START + timedelta(minutes=40))["message"]
+    assert rule.tick(START + timedelta(minutes=50)) is None
+    # The late uplink only reports the recovery, not the same gap again
+    assert "wieder" in rule.evaluate(make_uplink(60))["message"]
+    assert "ausgefallen" in rule.evaluate(make_uplink(100))["message"]
+
+
+def test_missed_uplink_rule_starts_clock_without_uplinks():
+    rule = alerts.MissedUplinkRule(max_gap=timedelta(minutes=30))
+
+    assert rule.tick(START) is None
+    assert rule.tick(START + timedelta(minutes=31)) is not None
+
+
+def test_engine_does_not_reprocess_uplinks_across_polls():
+    sink = ListSink()
+    engine = alerts.AlertEngine([alerts.ReedSwitchRule()], [sink])
+
+    first = make_df(make_uplink(1, reedSwitchStatus=1), make_uplink(0, reedSwitchStatus=0))
+    assert len(engine.process_new(first)) == 1
+
+    # TTN returns the last uplink again together with a new one
+    second = make_df(make_uplink(1, reedSwitchStatus=1), make_uplink(2, reedSwitchStatus=0))
+    assert [a["message"] for a in engine.process_new(second)] == ["Reed-Schalter geändert: 1 -> 0"]
+    assert engine.process_new(second) == []
+    assert engine.process_new(pd.DataFrame()) == []
+    assert len(sink.alerts) == 2
+
+
+def test_engine_continues_after_a_bad_uplink_in_a_batch():
+    class FailingRule(alerts.Rule):
+        name = "failing"
+
+        def evaluate(self, uplink):
+            if uplink["satellites"] == 0:
+                raise ValueError("bad uplink")
+            return None
+
+    sink = ListSink()
+    rules = [FailingRule(), alerts.GeofenceRule(*MOORING), alerts.ReedSwitchRule()]
+    engine = alerts.AlertEngine(rules, [sink])
+
+    df = make_df(
+        make_uplink(0, reedSwitchStatus=0),
+        make_uplink(1, reedSwitchStatus=1, satellites=0, latitude=float("nan")),
+        make_uplink(2, reedSwitchStatus=1),
+    )
+    assert [a["message"] for a in engine.process_new(df)] == ["Reed-Schalter geändert: 0 -> 1"]
+
+    # The next poll returns the same batch and nothing is sent again
+    assert engine.process_new(df) == []
+    assert len(sink.alerts) == 1
+
+
+def test_engine_keeps_dispatching_when_a_sink_fails():
+    class BrokenSink:
+        def send(self, alert):
+            raise OSError("unreachable")
+
+    sink = ListSink()
+    engine = alerts.AlertEngine([alerts.ReedSwitchRule()], [BrokenSink(), sink])
+    engine.process_new(make_df(make_uplink(0, reedSwitchStatus=0), make_uplink(1, reedSwitchStatus=1)))
+
+    assert len(sink.alerts) == 1
+
+
+def test_file_sink_writes_json_lines(tmp_path):
+    path = tmp_path / "alerts.jsonl"
+    engine = alerts.AlertEngine([alerts.ReedSwitchRule()], [alerts.FileSink(str(path))])
+    engine.process_new(make_df(
+        make_uplink(0, reedSwitchStatus=0),
+        make_uplink(1, reedSwitchStatus=1),
+        make_uplink(2, reedSwitchStatus=0),
+    ))
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["rule"] for line in lines] == ["reed_switch", "reed_switch"]
+    assert lines[1]["message"] == "Reed-Schalter geändert: 1 -> 0"
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise alerts.requests.HTTPError(f"{self.status_code} Error")
+
+
+def test_get_ttn_data_raises_on_http_error(monkeypatch):
+    monkeypatch.setattr(alerts.ttn.requests, "get", lambda *args, **kwargs: FakeResponse(401))
+
+    with pytest.raises(alerts.requests.HTTPError):
+        alerts.ttn.get_ttn_data("expired-key", "2024-05-01T12:00:00Z")
+
+
+def test_watch_alerts_on_repeated_http_errors(monkeypatch):
+    class Stop(Exception):
+        pass
+
+    calls = []
+
+    def get(*args, **kwargs):
+        calls.append(kwargs["timeout"])
+        return FakeResponse(503)
+
+    def sleep(interval):
+        if len(calls) == 3:
+            raise Stop()
+
+    monkeypatch.setattr(alerts.ttn.requests, "get", get)
+    monkeypatch.setattr(alerts.time, "sleep", sleep)
+
+    sink = ListSink()
+    with pytest.raises(Stop):
+        alerts.watch(alerts.AlertEngine([], [sink]), timeout=5, max_failures=3)
+
+    assert calls == [5, 5, 5]
+    assert [a["rule"] for a in sink.alerts] == ["fetch"]
+
+
+def test_watch_survives_fetch_errors_and_alerts(monkeypatch):
+    class Stop(Exception):
+        pass
+
+    calls = []
+
+    def failing_fetch(key, timestamp, timeout=None):
+        calls.append(timeout)
+        raise ConnectionError("TTN unreachable")
+
+    def sleep(interval):
+        if len(calls) == 4:
+            raise Stop()
+
+    monkeypatch.setattr(alerts.ttn, "get_ttn_data", failing_fetch)
+    monkeypatch.setattr(alerts.time, "sleep", sleep)
+
+    sink = ListSink()
+    engine = alerts.AlertEngine([], [sink])
+    try:
+        alerts.watch(engine, timeout=5, max_failures=3)
+    except Stop:
+        pass
+
+    assert calls == [5, 5, 5, 5]
+    assert [a["rule"] for a in sink.alerts] == ["fetch"]
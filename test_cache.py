@@ -0,0 +1,194 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import cache
+
+
+@pytest.fixture
+def disk_backend(tmp_path):
+    backend = cache.DiskCache(str(tmp_path))
+    cache.set_backend(backend)
+    yield backend
+    cache.set_backend(None)
+
+
+def make_ttn_frame():
+    # Same shape as ttn.get_ttn_data, the second gateway has no location
+    return pd.DataFrame([
+        {
+            "received_at": "2024-05-01T12:00:00.123456789Z",
+            "batteryVoltage": 4.1,
+            "humidity": 55.0,
+            "latitude": 47.5659,
+            "longitude": 9.3787,
+            "reedSwitchStatus": 0,
+            "satellites": 7,
+            "temperature": 18.5,
+            "count_gw": 2,
+            "id_gw_1": "gw-1",
+            "latitude_gw_1": 47.56,
+            "id_gw_2": "gw-2",
+            "latitude_gw_2": None,
+            "snr_gw_2": None,
+        }
+    ])
+
+
+def test_disk_cache_hit_and_expiry(disk_backend):
+    calls = []
+
+    @cache.shared_cache(ttl=60)
+    def load(days):
+        calls.append(days)
+        return pd.DataFrame({"days": [days]})
+
+    assert load(7)["days"].iloc[0] == 7
+    assert load(7)["days"].iloc[0] == 7
+    assert calls == [7]
+
+    # Let the entry expire
+    key = cache.make_key(load.__wrapped__, (7,), {})
+    assert disk_backend.get(key) is not None
+    disk_backend.set(key, cache.serialize(pd.DataFrame({"days": [0]})), ttl=-1)
+    assert load(7)["days"].iloc[0] == 7
+    assert calls == [7, 7]
+
+
+def test_disk_cache_deletes_expired_entries(tmp_path):
+    backend = cache.DiskCache(str(tmp_path), prune_interval=0)
+    backend.set("old", b"data", ttl=-1)
+    assert backend.get("old") is None
+    assert list(tmp_path.iterdir()) == []
+
+    backend.set("old", b"data", ttl=-1)
+    backend.set("new", b"data", ttl=60)
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_concurrent_misses_call_upstream_once(disk_backend):
+    calls = []
+    started = threading.Barrier(8)
+
+    @cache.shared_cache(ttl=60, poll_interval=0.01)
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return pd.DataFrame({"value": [1]})
+
+    def worker():
+        started.wait()
+        assert load()["value"].iloc[0] == 1
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache._key_locks == {}
+
+
+def test_parquet_round_trip_of_ttn_frame():
+    df = make_ttn_frame()
+    restored = cache.deserialize(cache.serialize(df))
+
+    pd.testing.assert_frame_equal(restored, df)
+
+
+def test_backend_errors_fall_back_to_func():
+    class BrokenBackend:
+        def get(self, key):
+            raise ConnectionError("redis unreachable")
+
+        def acquire(self, key, timeout):
+            raise ConnectionError("redis unreachable")
+
+    cache.set_backend(BrokenBackend())
+    try:
+        @cache.shared_cache(ttl=60)
+        def load():
+            return pd.DataFrame({"value": [1]})
+
+        assert load()["value"].iloc[0] == 1
+    finally:
+        cache.set_backend(None)
+
+
+def test_serialization_errors_keep_the_result(disk_backend):
+    @cache.shared_cache(ttl=60)
+    def load():
+        return {"not": "a dataframe"}
+
+    assert load() == {"not": "a dataframe"}
+
+
+def test_release_keeps_a_lock_taken_over_by_another_owner(tmp_path):
+    backend = cache.DiskCache(str(tmp_path))
+    slow_token = backend.acquire("key", timeout=60)
+
+    # The slow holder's lock is considered stale and taken over
+    assert backend.acquire("key", timeout=-1) is None
+    new_token = backend.acquire("key", timeout=60)
+    assert new_token is not None
+
+    backend.release("key", slow_token)
+    assert backend.acquire("key", timeout=60) is None
+    backend.release("key", new_token)
+    assert backend.acquire("key", timeout=60) is not None
+
+
+def test_redis_cache_with_fakeredis():
+    fakeredis = pytest.importorskip("fakeredis")
+    backend = cache.RedisCache(client=fakeredis.FakeRedis())
+    cache.set_backend(backend)
+    calls = []
+    try:
+        @cache.shared_cache(ttl=60)
+        def load():
+            calls.append(1)
+            return make_ttn_frame()
+
+        pd.testing.assert_frame_equal(load(), make_ttn_frame())
+        pd.testing.assert_frame_equal(load(), make_ttn_frame())
+        assert calls == [1]
+    finally:
+        cache.set_backend(None)
+
+    # Releasing with a foreign token keeps the lock
+    token = backend.acquire("key", timeout=60)
+    backend.release("key", "someone-else")
+    assert backend.acquire("key", timeout=60) is None
+    backend.release("key", token)
+    assert backend.acquire("key", timeout=60) is not None
+
+
+def test_key_changes_with_function_code():
+    def load(days):
+        return days
+
+    old_key = cache.make_key(load, (7,), {})
+
+    def load(days):
+        return days * 2
+
+    assert cache.make_key(load, (7,), {}) != old_key
+
+
+def test_upstream_errors_are_not_cached(disk_backend):
+    calls = []
+
+    @cache.shared_cache(ttl=60)
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("TTN unreachable")
+        return pd.DataFrame({"value": [1]})
+
+    with pytest.raises(ConnectionError):
+        load()
+    assert load()["value"].iloc[0] == 1
+    assert len(calls) == 2
@@ -3,10 +3,20 @@ import json
 import pandas as pd
 from datetime import datetime, timedelta
 
+PAYLOAD_FIELDS = [
+    "batteryVoltage",
+    "humidity",
+    "latitude",
+    "longitude",
+    "reedSwitchStatus",
+    "satellites",
+    "temperature",
+]
+
 
 def get_current_timestamp_minus_one_hour():
-    # Get the current UTC time
-    current_time = datetime.utcnow()
+    # Get the current UTC time, rounded down to the minute so repeated calls share a cache entry
+    current_time = datetime.utcnow().replace(second=0, microsecond=0)
 
     # Subtract 1 hour from the current time
     one_hour_ago = current_time - timedelta(hours=1)
@@ -17,21 +27,20 @@ def get_current_timestamp_minus_one_hour():
     return timestamp
 
 
-def retrieve_stored_uplinks(api_key, application_id, timestamp):
+def retrieve_stored_uplinks(api_key, application_id, timestamp, timeout=None):
     url = f"https://eu1.cloud.thethings.network/api/v3/as/applications/{application_id}/packages/storage/uplink_message"
     headers = {"Authorization": f"Bearer {api_key}", "Accept": "text/event-stream"}
     params = {"after": timestamp}
 
-    response = requests.get(url, headers=headers, params=params)
+    response = requests.get(url, headers=headers, params=params, timeout=timeout)
 
-    if response.status_code == 200:
-        return response.text
-    else:
-        return f"Error: {response.status_code}"
+    # Raise on HTTP errors (e.g. an expired key) so callers do not mistake them for "no uplinks"
+    response.raise_for_status()
+    return response.text
 
 
-def get_ttn_data(TTN_KEY, timestamp=get_current_timestamp_minus_one_hour()):
-    result = retrieve_stored_uplinks(TTN_KEY, "lora-test-sli1", timestamp)
+def get_ttn_data(TTN_KEY, timestamp=get_current_timestamp_minus_one_hour(), timeout=None):
+    result = retrieve_stored_uplinks(TTN_KEY, "lora-test-sli1", timestamp, timeout)
 
     # Split the string by lines and filter out empty lines
     json_strings = [line for line in result.split("\n") if line.strip()]
@@ -47,6 +56,14 @@ def get_ttn_data(TTN_KEY, timestamp=get_current_timestamp_minus_one_hour()):
     # Extract data from the JSON and create a list of dictionaries
     extracted_data = []
     for entry in dict_list:
+        # Skip uplinks without a complete decoded payload instead of failing the whole batch
+        uplink_message = entry.get("result", {}).get("uplink_message", {})
+        decoded_payload = uplink_message.get("decoded_payload", {})
+        missing = [field for field in PAYLOAD_FIELDS if field not in decoded_payload]
+        if missing or "rx_metadata" not in uplink_message:
+            print(f"Error extracting uplink, missing fields: {missing or ['rx_metadata']}")
+            continue
+
         # Start by extracting the common data that doesn't depend on the number of gateways
         extracted_entry = {
             "received_at": entry["result"]["received_at"],